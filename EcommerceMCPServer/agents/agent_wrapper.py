@@ -3,12 +3,20 @@ from google.adk.agents.llm_agent import LlmAgent
 from google.adk.tools.mcp_tool.mcp_toolset import MCPToolset
 from typing import List, Dict, Any, Optional
 from src.utils.config_loader import config_loader
+from src.utils.tracing import tracer, Span
+from agents.traced_mcp_toolset import TracedMcpToolset
 import logging
 from google.adk.tools.mcp_tool.mcp_session_manager import StreamableHTTPServerParams
 import asyncio
+import time
+import uuid
 
 logger = logging.getLogger(__name__)
 
+# ADK skips after_agent_callback when a turn raises; spans of turns older than this are
+# closed as failed so they are still exported and do not accumulate
+STALE_TURN_SECONDS = 600
+
 class AgentWrapper:
 
     def __init__(self, tool_filter: Optional[List[str]] = None):
@@ -22,6 +30,10 @@ class AgentWrapper:
         self.agent: Optional[LlmAgent] = None
         self.toolsets: List[MCPToolset] = []
         self.server_status: Dict[str, str] = {}
+        # Identifies this agent's cart on the MCP servers
+        self.client_id = uuid.uuid4().hex
+        # Open spans per invocation: the turn span under "turn", plus in-flight LLM/tool spans
+        self._spans: Dict[str, Dict[str, Span]] = {}
         
         logger.info("AgentWrapper initialized")
         if tool_filter:
@@ -41,7 +53,13 @@ class AgentWrapper:
                     model="gemini-2.0-flash-exp", 
                     name="mcp_assistant",
                     instruction=self._get_agent_instruction(),
-                    tools=[tool for tool in toolsets]  # Creates new list of ToolUnion, to avoid the error list invariant
+                    tools=[tool for tool in toolsets],  # Creates new list of ToolUnion, to avoid the error list invariant
+                    before_agent_callback=self._trace_turn_start,
+                    after_agent_callback=self._trace_turn_end,
+                    before_model_callback=self._trace_llm_start,
+                    after_model_callback=self._trace_llm_end,
+                    before_tool_callback=self._trace_tool_start,
+                    after_tool_callback=self._trace_tool_end
                 )
                 
                 self.toolsets = toolsets
@@ -53,7 +71,91 @@ class AgentWrapper:
 
     def _get_agent_instruction(self) -> str:
             """Get the system instruction that defines the agent's behavior and capabilities."""
-            return """You are a helpful assistant with access to tools that can help users view the products and add them to a shopping cart."""
+            return """You are a helpful assistant with access to tools that can help users view the products and add them to a shopping cart.
+When suggesting products, use the related_products tool instead of reasoning over the full product list."""
+
+    # ADK invokes callbacks by keyword, so parameter names below must match its signatures.
+    # Spans are kept per invocation rather than in the current context because the
+    # before/after halves of each callback pair do not share one.
+
+    def _trace_turn_start(self, callback_context: Any) -> None:
+        self._evict_stale_turns()
+        span = tracer.start_span(
+            "agent.turn",
+            attributes={"agent.name": callback_context.agent_name, "invocation.id": callback_context.invocation_id}
+        )
+        self._spans[callback_context.invocation_id] = {"turn": span}
+        return None
+
+    def _trace_turn_end(self, callback_context: Any) -> None:
+        spans = self._spans.pop(callback_context.invocation_id, {})
+        turn = spans.pop("turn", None)
+        # A tool or LLM call that raised had its after-callback skipped, but the turn went on
+        self._end_as_failed(spans.values(), "span not closed before end of turn")
+        if turn:
+            turn.end()
+        return None
+
+    def _end_as_failed(self, spans: Any, reason: str) -> None:
+        for span in spans:
+            span.set_error(RuntimeError(reason))
+            span.end()
+
+    def _evict_stale_turns(self, max_age: float = STALE_TURN_SECONDS) -> None:
+        """End and drop the spans of invocations that never reached after_agent_callback."""
+        cutoff = time.time_ns() - int(max_age * 1e9)
+        for invocation_id, spans in list(self._spans.items()):
+            if spans and min(span.start_ns for span in spans.values()) < cutoff:
+                del self._spans[invocation_id]
+                self._end_as_failed(spans.values(), "turn did not complete")
+
+    def _request_span(self, context: Any) -> Optional[Span]:
+        """
+        Agent-side span to parent an MCP request on: the tool call in progress for a tool
+        context, otherwise the invocation's turn (e.g. for the `tools/list` of each LLM step).
+        """
+        spans = self._spans.get(context.invocation_id, {})
+        function_call_id = getattr(context, "function_call_id", None)
+        return spans.get(f"tool:{function_call_id}") or spans.get("turn")
+
+    def _start_child_span(self, invocation_id: str, key: str, name: str, attributes: Dict[str, Any]) -> None:
+        spans = self._spans.setdefault(invocation_id, {})
+        spans[key] = tracer.start_span(name, attributes=attributes, parent=spans.get("turn"))
+
+    def _end_child_span(self, invocation_id: str, key: str) -> Optional[Span]:
+        span = self._spans.get(invocation_id, {}).pop(key, None)
+        if span:
+            span.end()
+        return span
+
+    def _trace_llm_start(self, callback_context: Any, llm_request: Any) -> None:
+        self._start_child_span(
+            callback_context.invocation_id, "llm", "llm.generate",
+            {"llm.model": llm_request.model or "", "llm.contents": len(llm_request.contents)}
+        )
+        return None
+
+    def _trace_llm_end(self, callback_context: Any, llm_response: Any) -> None:
+        span = self._spans.get(callback_context.invocation_id, {}).get("llm")
+        usage = llm_response.usage_metadata
+        if span and usage:
+            span.set_attribute("llm.usage.prompt_tokens", usage.prompt_token_count or 0)
+            span.set_attribute("llm.usage.completion_tokens", usage.candidates_token_count or 0)
+        if span and llm_response.error_code:
+            span.set_error(RuntimeError(f"{llm_response.error_code}: {llm_response.error_message}"))
+        self._end_child_span(callback_context.invocation_id, "llm")
+        return None
+
+    def _trace_tool_start(self, tool: Any, args: Dict[str, Any], tool_context: Any) -> None:
+        self._start_child_span(
+            tool_context.invocation_id, f"tool:{tool_context.function_call_id}", f"tool.call {tool.name}",
+            {"tool.name": tool.name}
+        )
+        return None
+
+    def _trace_tool_end(self, tool: Any, args: Dict[str, Any], tool_context: Any, tool_response: Any) -> None:
+        self._end_child_span(tool_context.invocation_id, f"tool:{tool_context.function_call_id}")
+        return None
 
     async def _load_toolsets(self) -> List[MCPToolset]:
             """
@@ -85,9 +187,11 @@ class AgentWrapper:
                         self.server_status[server_name] = "connection_failed"
                         continue
                     
-                    toolset = MCPToolset(
+                    toolset = TracedMcpToolset(
                         connection_params=connection_params,
-                        tool_filter=self.tool_filter  # Apply tool filtering if specified
+                        tool_filter=self.tool_filter,  # Apply tool filtering if specified
+                        span_provider=self._request_span,
+                        client_id=self.client_id
                     )
                     
 
@@ -154,6 +258,8 @@ class AgentWrapper:
         
         self.toolsets.clear()
         self.agent = None
+        self._evict_stale_turns(max_age=0)
+        tracer.flush()
         
         # Small delay to ensure cleanup completes
         await asyncio.sleep(0.5)
@@ -0,0 +1,102 @@
+"""
+Traced MCP Toolset
+MCPToolset whose tool listing and tool calls are traced, and carry the agent's client id and
+trace context to the server in request `_meta`.
+"""
+
+from google.adk.agents.readonly_context import ReadonlyContext
+from google.adk.tools.mcp_tool.mcp_tool import McpTool
+from google.adk.tools.mcp_tool.mcp_toolset import MCPToolset
+from google.adk.tools.mcp_tool.mcp_session_manager import MCPSessionManager, retry_on_closed_resource
+from google.adk.tools.tool_context import ToolContext
+from mcp import ClientSession, types
+from typing import Any, Callable, Dict, List, Optional
+from src.utils.tracing import tracer, Span, SPAN_KIND_CLIENT
+
+# Returns the agent-side span to parent MCP requests on: the tool call being executed for a
+# ToolContext, otherwise the turn of the invocation, if one is open
+SpanProvider = Callable[[ReadonlyContext], Optional[Span]]
+
+
+async def _create_session(
+    session_manager: MCPSessionManager,
+    headers: Optional[Dict[str, str]] = None
+) -> ClientSession:
+    """Get a pooled session, timing the reconnect and `initialize` handshake when one is needed."""
+    with tracer.span("mcp.create_session", kind=SPAN_KIND_CLIENT):
+        return await session_manager.create_session(headers=headers)
+
+
+class TracedMcpTool(McpTool):
+    """McpTool that sends `tools/call` with a `client_id` and `traceparent` in the request `_meta`."""
+
+    def __init__(self, *, span_provider: SpanProvider, client_id: str, **kwargs: Any):
+        super().__init__(**kwargs)
+        self._span_provider = span_provider
+        self._client_id = client_id
+
+    @retry_on_closed_resource
+    async def _run_async_impl(self, *, args, tool_context: ToolContext, credential) -> Any:
+        # Same as McpTool._run_async_impl, except that the request is built here so `_meta`
+        # can be set; ClientSession.call_tool does not accept it
+        with tracer.span(
+            f"tools/call {self.name}",
+            kind=SPAN_KIND_CLIENT,
+            attributes={"mcp.tool.name": self.name},
+            parent=self._span_provider(tool_context)
+        ) as span:
+            headers = await self._get_headers(tool_context, credential)
+            session = await _create_session(self._mcp_session_manager, headers)
+
+            params = types.CallToolRequestParams(
+                name=self.name,
+                arguments=args,
+                _meta=tracer.inject({"client_id": self._client_id}, span)
+            )
+            response = await session.send_request(
+                types.ClientRequest(types.CallToolRequest(method="tools/call", params=params)),
+                types.CallToolResult,
+            )
+            span.set_attribute("mcp.tool.is_error", response.isError)
+            return response
+
+
+class TracedMcpToolset(MCPToolset):
+    """MCPToolset that traces `tools/list` and hands out TracedMcpTool instances."""
+
+    def __init__(self, *, span_provider: SpanProvider, client_id: str, **kwargs: Any):
+        super().__init__(**kwargs)
+        self._span_provider = span_provider
+        self._client_id = client_id
+
+    @retry_on_closed_resource
+    async def get_tools(self, readonly_context: Optional[ReadonlyContext] = None) -> List[McpTool]:
+        # Same as MCPToolset.get_tools, which ADK calls on every LLM step, with the
+        # `tools/list` round trip traced and carrying `_meta`
+        with tracer.span(
+            "tools/list",
+            kind=SPAN_KIND_CLIENT,
+            parent=self._span_provider(readonly_context) if readonly_context else None
+        ) as span:
+            session = await _create_session(self._mcp_session_manager)
+
+            params = types.PaginatedRequestParams(_meta=tracer.inject({"client_id": self._client_id}, span))
+            response = await session.send_request(
+                types.ClientRequest(types.ListToolsRequest(method="tools/list", params=params)),
+                types.ListToolsResult,
+            )
+            span.set_attribute("mcp.tools.count", len(response.tools))
+
+        tools = []
+        for tool in response.tools:
+            mcp_tool = TracedMcpTool(
+                mcp_tool=tool,
+                mcp_session_manager=self._mcp_session_manager,
+                auth_scheme=self._auth_scheme,
+                auth_credential=self._auth_credential,
+                span_provider=self._span_provider,
+                client_id=self._client_id
+            )
+            if self._is_tool_selected(mcp_tool, readonly_context):
+                tools.append(mcp_tool)
+        return tools
@@ -0,0 +1,457 @@
+"""
+MCP Traffic Replayer
+Replays recorded MCP sessions against a server and reports latency drift, memory growth
+and leaked sessions over long soak runs.
+"""
+
+import gc
+import os
+import sys
+import json
+import time
+import uuid
+import asyncio
+import logging
+import contextlib
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import click
+from mcp import ClientSession, types
+from mcp.shared.exceptions import McpError
+from mcp.client.streamable_http import streamablehttp_client
+
+# Make the project packages (src/, clients/) importable when run as a script
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from src.utils.recorder import load_recording, iter_exchanges
+from src.utils.formatter import formatter
+from clients.streamablehttp_client import MCPClient
+from servers.launcher import launcher
+
+logger = logging.getLogger(__name__)
+
+# Performed by ClientSession.initialize() on every replayed session
+HANDSHAKE_METHODS = {"initialize", "notifications/initialized"}
+
+# "raw" drives a bare ClientSession; "mcp-client" connects and disconnects an MCPClient per
+# session, so leaks in the client wrapper's own setup and teardown show up too
+REPLAY_MODES = ("raw", "mcp-client")
+
+
+def parse_speed(value: str) -> float:
+    """Parse "1x", "4x" or "max" into a time scale factor, where 0 means no pacing."""
+    value = value.strip().lower()
+    if value == "max":
+        return 0.0
+    try:
+        speed = float(value.rstrip("x"))
+    except ValueError:
+        raise click.BadParameter(f"Invalid speed '{value}', expected e.g. '1x', '10x' or 'max'")
+    if speed <= 0:
+        raise click.BadParameter("Speed must be positive")
+    return speed
+
+
+def _percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return round(ordered[index], 3)
+
+
+def _rss_bytes(pid: int) -> Optional[int]:
+    """Resident set size of a process, or None where /proc is unavailable."""
+    try:
+        with open(f"/proc/{pid}/statm", 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _open_fds(pid: Optional[int] = None) -> Optional[int]:
+    """Number of open file descriptors of a process (default: this one)."""
+    try:
+        return len(os.listdir(f"/proc/{pid or 'self'}/fd"))
+    except OSError:
+        return None
+
+
+def _child_processes(pid: int) -> Optional[int]:
+    """Number of live child processes of a process, or None where /proc is unavailable."""
+    try:
+        entries = [entry for entry in os.listdir("/proc") if entry.isdigit()]
+    except OSError:
+        return None
+
+    children = 0
+    for entry in entries:
+        try:
+            with open(f"/proc/{entry}/stat", 'r') as f:
+                # The command name may contain spaces, so fields are counted from its closing paren
+                fields = f.read().rsplit(")", 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        if int(fields[1]) == pid:
+            children += 1
+    return children
+
+
+def _live_client_sessions() -> int:
+    gc.collect()
+    return sum(1 for obj in gc.get_objects() if isinstance(obj, ClientSession))
+
+
+class SoakReplayer:
+    """Replays recorded sessions concurrently and collects soak-test measurements."""
+
+    def __init__(
+        self,
+        server_url: str,
+        sessions: List[List[Dict[str, Any]]],
+        speed: float = 1.0,
+        concurrency: int = 1,
+        iterations: int = 1,
+        duration: float = 0.0,
+        server_pid: Optional[int] = None,
+        mode: str = "raw",
+        session_timeout: float = 60.0,
+        sample_interval: float = 1.0
+    ):
+        """
+        Initialize the replayer.
+
+        Args:
+            server_url: MCP endpoint to replay against.
+            sessions: Recorded exchanges per session, as produced by iter_exchanges.
+            speed: Time scale for replay pacing; 0 sends as fast as possible.
+            concurrency: Number of sessions replayed at the same time.
+            iterations: Times each recorded session is replayed (ignored when duration is set).
+            duration: If positive, keep replaying sessions for this many seconds.
+            server_pid: Local server process to sample memory, open fds and child processes from.
+            mode: One of REPLAY_MODES.
+            session_timeout: Seconds after which a replayed session is abandoned.
+            sample_interval: Seconds between memory samples.
+        """
+        self.server_url = server_url
+        self.sessions = sessions
+        self.speed = speed
+        self.concurrency = concurrency
+        self.iterations = iterations
+        self.duration = duration
+        self.server_pid = server_pid
+        self.mode = mode
+        self.session_timeout = session_timeout
+        self.sample_interval = sample_interval
+
+        self._next_run = 0
+        self.sessions_completed = 0
+        self.sessions_failed = 0
+        # (completed_at, method, recorded_ms, replay_ms, ok) per replayed request
+        self.samples: List[tuple] = []
+        # (elapsed_s, client_rss, server_rss, server_fds, server_children)
+        self.memory_samples: List[tuple] = []
+
+    async def run(self) -> Dict[str, Any]:
+        """Replay until the configured iterations or duration are exhausted and return the report."""
+        baseline_sessions = _live_client_sessions()
+        baseline_tasks = len(asyncio.all_tasks())
+        baseline_fds = _open_fds()
+
+        started = time.perf_counter()
+        deadline = started + self.duration if self.duration > 0 else None
+        sampler = asyncio.create_task(self._sample_memory(started))
+
+        try:
+            await asyncio.gather(*(self._worker(deadline) for _ in range(self.concurrency)))
+        finally:
+            sampler.cancel()
+            try:
+                await sampler
+            except asyncio.CancelledError:
+                pass
+
+        elapsed = time.perf_counter() - started
+        self._take_memory_sample(started)
+
+        # Give transports a moment to finish tearing down before looking for leftovers
+        await asyncio.sleep(0.5)
+        fds = _open_fds()
+        leaks = {
+            "client_sessions": _live_client_sessions() - baseline_sessions,
+            "asyncio_tasks": len(asyncio.all_tasks()) - baseline_tasks,
+            "open_fds": fds - baseline_fds if fds is not None and baseline_fds is not None else None,
+        }
+        return self._build_report(elapsed, leaks)
+
+    async def _worker(self, deadline: Optional[float]) -> None:
+        total_runs = self.iterations * len(self.sessions)
+        while True:
+            if deadline is not None:
+                if time.perf_counter() >= deadline:
+                    return
+            elif self._next_run >= total_runs:
+                return
+
+            run = self._next_run
+            self._next_run += 1
+            await self._replay_session(self.sessions[run % len(self.sessions)])
+
+    async def _replay_session(self, exchanges: List[Dict[str, Any]]) -> None:
+        try:
+            async with asyncio.timeout(self.session_timeout):
+                if self.mode == "mcp-client":
+                    await self._replay_with_mcp_client(exchanges)
+                else:
+                    async with streamablehttp_client(self.server_url) as (read_stream, write_stream, _):
+                        async with ClientSession(read_stream, write_stream) as session:
+                            await session.initialize()
+                            await self._play(session, exchanges, uuid.uuid4().hex)
+            self.sessions_completed += 1
+        except Exception as e:
+            self.sessions_failed += 1
+            logger.error(f"Replayed session failed: {type(e).__name__}: {e}")
+
+    async def _replay_with_mcp_client(self, exchanges: List[Dict[str, Any]]) -> None:
+        client = MCPClient(self.server_url)
+        try:
+            await client.connect()
+            await self._play(client.session, exchanges, client.client_id)
+        finally:
+            await client.disconnect()
+
+    async def _play(self, session: ClientSession, exchanges: List[Dict[str, Any]], client_id: str) -> None:
+        started = time.perf_counter()
+
+        for exchange in exchanges:
+            message = exchange["message"]
+            if message["method"] in HANDSHAKE_METHODS:
+                continue
+
+            if self.speed:
+                delay = started + exchange["offset_ms"] / 1000 / self.speed - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+            payload = {"method": message["method"]}
+            params = self._replay_params(message.get("params"), client_id)
+            if params is not None:
+                payload["params"] = params
+
+            if "id" not in message:
+                await session.send_notification(types.ClientNotification.model_validate(payload))
+                continue
+
+            request = types.ClientRequest.model_validate(payload)
+            sent_at = time.perf_counter()
+            ok = True
+            try:
+                # Result allows extra fields, so any response shape validates
+                await session.send_request(request, types.Result)
+            except McpError as e:
+                ok = False
+                logger.debug(f"{message['method']} returned an error: {e}")
+            completed_at = time.perf_counter()
+
+            self.samples.append((
+                completed_at,
+                self._operation(message),
+                exchange["latency_ms"],
+                (completed_at - sent_at) * 1000,
+                ok
+            ))
+
+    def _operation(self, message: Dict[str, Any]) -> str:
+        """Latency key for a request, e.g. "tools/call related_products" rather than just the method."""
+        params = message.get("params") or {}
+        if message["method"] == "tools/call" and "name" in params:
+            return f"tools/call {params['name']}"
+        if message["method"] == "resources/read" and "uri" in params:
+            return f"resources/read {params['uri']}"
+        return message["method"]
+
+    def _replay_params(self, params: Optional[Dict[str, Any]], client_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Prepare recorded params for replay.
+
+        Recorded trace ids are dropped so replayed requests don't attach to the original traces,
+        and a recorded client id is replaced so concurrent replays of a session get separate carts.
+        """
+        if not params or "_meta" not in params:
+            return params
+        meta = {key: value for key, value in params["_meta"].items() if key != "traceparent"}
+        if "client_id" in meta:
+            meta["client_id"] = client_id
+        params = dict(params)
+        if meta:
+            params["_meta"] = meta
+        else:
+            del params["_meta"]
+        return params
+
+    async def _sample_memory(self, started: float) -> None:
+        while True:
+            self._take_memory_sample(started)
+            await asyncio.sleep(self.sample_interval)
+
+    def _take_memory_sample(self, started: float) -> None:
+        server_pid = self.server_pid
+        self.memory_samples.append((
+            time.perf_counter() - started,
+            _rss_bytes(os.getpid()),
+            _rss_bytes(server_pid) if server_pid else None,
+            _open_fds(server_pid) if server_pid else None,
+            _child_processes(server_pid) if server_pid else None
+        ))
+
+    def _series_summary(self, column: int, unit: str = "") -> Optional[Dict[str, int]]:
+        values = [sample[column] for sample in self.memory_samples if sample[column] is not None]
+        if not values:
+            return None
+        suffix = f"_{unit}" if unit else ""
+        return {f"start{suffix}": values[0], f"end{suffix}": values[-1], f"peak{suffix}": max(values),
+                f"growth{suffix}": values[-1] - values[0]}
+
+    def _build_report(self, elapsed: float, leaks: Dict[str, Any]) -> Dict[str, Any]:
+        by_operation: Dict[str, Dict[str, List[float]]] = {}
+        for _, operation, recorded_ms, replay_ms, _ in self.samples:
+            latencies = by_operation.setdefault(operation, {"recorded": [], "replay": []})
+            if recorded_ms is not None:
+                latencies["recorded"].append(recorded_ms)
+            latencies["replay"].append(replay_ms)
+
+        latency = {
+            operation: {
+                "count": len(latencies["replay"]),
+                "recorded_p50_ms": _percentile(latencies["recorded"], 50),
+                "recorded_p95_ms": _percentile(latencies["recorded"], 95),
+                "replay_p50_ms": _percentile(latencies["replay"], 50),
+                "replay_p95_ms": _percentile(latencies["replay"], 95),
+            }
+            for operation, latencies in sorted(by_operation.items())
+        }
+
+        # Drift compares the earliest and latest tenth of the run, so slow degradation shows up
+        ordered = [sample[3] for sample in sorted(self.samples, key=lambda sample: sample[0])]
+        window = max(1, len(ordered) // 10)
+        first_p50 = _percentile(ordered[:window], 50)
+        last_p50 = _percentile(ordered[-window:], 50)
+        drift_pct = None
+        if first_p50 and last_p50 is not None:
+            drift_pct = round((last_p50 - first_p50) / first_p50 * 100, 1)
+
+        errors = sum(1 for sample in self.samples if not sample[4])
+        return {
+            "server_url": self.server_url,
+            "duration_s": round(elapsed, 3),
+            "speed": f"{self.speed:g}x" if self.speed else "max",
+            "concurrency": self.concurrency,
+            "mode": self.mode,
+            "sessions": {"completed": self.sessions_completed, "failed": self.sessions_failed},
+            "requests": {
+                "total": len(self.samples),
+                "errors": errors,
+                "throughput_rps": round(len(self.samples) / elapsed, 2) if elapsed else None,
+            },
+            "latency": latency,
+            "latency_drift": {"first_window_p50_ms": first_p50, "last_window_p50_ms": last_p50,
+                              "drift_pct": drift_pct},
+            "memory": {"client": self._series_summary(1, "bytes"), "server": self._series_summary(2, "bytes")},
+            "server_process": {
+                "pid": self.server_pid,
+                "open_fds": self._series_summary(3),
+                "child_processes": self._series_summary(4),
+            },
+            "leaks": leaks,
+        }
+
+
+@click.command()
+@click.argument("recording", type=click.Path(exists=True, dir_okay=False))
+@click.option("--url", default=None, help="Server URL to replay against (defaults to the recorded server)")
+@click.option("--speed", default="1x", help="Replay speed: '1x', 'Nx' or 'max'")
+@click.option("--concurrency", default=1, help="Number of sessions replayed concurrently")
+@click.option("--iterations", default=1, help="Times to replay each recorded session")
+@click.option("--duration", default=0.0, help="Soak for this many seconds instead of a fixed number of iterations")
+@click.option("--mode", default="raw", type=click.Choice(REPLAY_MODES),
+              help="Replay through a bare ClientSession or through MCPClient connect/disconnect")
+@click.option("--server-pid", default=None, type=int,
+              help="PID of the local server process to sample memory, open fds and child processes from")
+@click.option("--launch", is_flag=True, help="Start the server with ServerLauncher and sample it")
+@click.option("--host", default="localhost", help="Host for the launched server")
+@click.option("--port", default=8000, help="Port for the launched server")
+@click.option("--report", default=None, help="Also write the report as JSON to this file")
+@click.option("--log-level", default="INFO", help="Logging level")
+
+def main(
+    recording: str,
+    url: Optional[str],
+    speed: str,
+    concurrency: int,
+    iterations: int,
+    duration: float,
+    mode: str,
+    server_pid: Optional[int],
+    launch: bool,
+    host: str,
+    port: int,
+    report: Optional[str],
+    log_level: str
+) -> None:
+    logging.basicConfig(
+        level=getattr(logging, log_level.upper(), logging.INFO),
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+    )
+
+    header, recorded = load_recording(recording)
+    sessions = [list(iter_exchanges(events)) for _, events in sorted(recorded.items())]
+    # A server-side recording of a stateless server sees the handshake as separate sessions,
+    # which ClientSession.initialize() already covers on every replay
+    sessions = [
+        exchanges for exchanges in sessions
+        if any(exchange["message"]["method"] not in HANDSHAKE_METHODS for exchange in exchanges)
+    ]
+    if not sessions:
+        raise click.ClickException(f"No sessions found in {recording}")
+
+    if launch:
+        # The launched server must not record the soak, and would otherwise pick up
+        # MCP_RECORD_PATH from this environment. Set empty rather than removed, because
+        # load_dotenv only fills in variables that are absent
+        server_env = dict(os.environ, MCP_RECORD_PATH="")
+        if not launcher.start_ecommerce_server(port=port, host=host, env=server_env):
+            launcher.stop_all_servers()
+            raise click.ClickException(f"Launched server did not become ready on {host}:{port}")
+        server_url = url or f"http://{host}:{port}/mcp"
+        server_pid = launcher.processes[-1].pid
+    else:
+        server_url = url or header.get("server_url") or "http://localhost:8000/mcp"
+    logger.info(f"Replaying {len(sessions)} recorded sessions against {server_url} ({mode})")
+
+    replayer = SoakReplayer(
+        server_url,
+        sessions,
+        speed=parse_speed(speed),
+        concurrency=concurrency,
+        iterations=iterations,
+        duration=duration,
+        server_pid=server_pid,
+        mode=mode
+    )
+    try:
+        # MCPClient prints its tool list on every connect, which would bury the report
+        with open(os.devnull, 'w') as devnull:
+            with contextlib.redirect_stdout(devnull) if mode == "mcp-client" else contextlib.nullcontext():
+                result = asyncio.run(replayer.run())
+    finally:
+        if launch:
+            launcher.stop_all_servers()
+
+    formatter.print_json_response(result, title="Soak Report")
+    if report:
+        with open(report, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+        logger.info(f"Report written to: {report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,23 @@
 import asyncio
-from typing import Optional
-from mcp import ClientSession
+import sys
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Optional
+from mcp import ClientSession, types
 from mcp.client.streamable_http import streamablehttp_client
 
+# Make the project packages (src/, clients/) importable when run as a script
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from src.utils.tracing import tracer, SPAN_KIND_CLIENT
+from src.utils.recorder import TrafficRecorder
+
 
 class MCPClient:
-    def __init__(self, server_url: str):
+    def __init__(self, server_url: str, recorder: Optional[TrafficRecorder] = None):
         self.server_url = server_url
+        self.recorder = recorder
+        # Identifies this client's cart on the server
+        self.client_id = uuid.uuid4().hex
         self.session: Optional[ClientSession] = None
         self.tools = []
         self.resources = []
@@ -15,16 +26,28 @@ class MCPClient:
 
 
     async def connect(self):
-        # Connect to the streamable HTTP server
-        self.client_context = streamablehttp_client(self.server_url)
-        read_stream, write_stream, _ = await self.client_context.__aenter__()
-        
-        # Create a session using the client streams
-        self.session_context = ClientSession(read_stream, write_stream)
-        
-        self.session = await self.session_context.__aenter__()
-        await self.session.initialize()
-        resp = await self.session.list_tools()
+        with tracer.span("mcp.connect", attributes={"server.url": self.server_url}):
+            await self._connect()
+
+    async def _connect(self):
+        with tracer.span("initialize", kind=SPAN_KIND_CLIENT, attributes={"server.url": self.server_url}) as span:
+            # The handshake cannot carry `_meta`, so the trace context goes in a header. It stays
+            # on the connection, but later requests set `_meta`, which the server prefers
+            headers = tracer.inject({}, span)
+
+            # Connect to the streamable HTTP server
+            self.client_context = streamablehttp_client(self.server_url, headers=headers)
+            read_stream, write_stream, _ = await self.client_context.__aenter__()
+            if self.recorder:
+                read_stream, write_stream = self.recorder.wrap(read_stream, write_stream)
+
+            # Create a session using the client streams
+            self.session_context = ClientSession(read_stream, write_stream)
+
+            self.session = await self.session_context.__aenter__()
+            await self.session.initialize()
+
+        resp = await self._list("tools/list", types.ListToolsRequest, types.ListToolsResult)
         self.tools = [
             {
                 "name": t.name,
@@ -35,7 +58,7 @@ class MCPClient:
         ]
         print("✅ Connected: Tools available =", [t["name"] for t in self.tools])
 
-        resp = await self.session.list_resources()
+        resp = await self._list("resources/list", types.ListResourcesRequest, types.ListResourcesResult)
         self.resources = [
             {
                 "name": r.name,
@@ -46,15 +69,46 @@ class MCPClient:
         ]
         print("✅ Connected: Resources available =", [r["name"] for r in self.resources])
 
+    async def _list(self, method: str, request_type: Any, result_type: Any) -> Any:
+        """Send a list request, with the client id and trace context in `_meta`."""
+        with tracer.span(method, kind=SPAN_KIND_CLIENT, attributes={"server.url": self.server_url}) as span:
+            params = types.PaginatedRequestParams(_meta=tracer.inject({"client_id": self.client_id}, span))
+            return await self.session.send_request(
+                types.ClientRequest(request_type(method=method, params=params)),
+                result_type,
+            )
+
+    async def call_tool(self, name: str, arguments: Optional[Dict[str, Any]] = None) -> types.CallToolResult:
+        """Call a tool, sending the client id and current trace context to the server in `_meta`."""
+        with tracer.span(
+            f"tools/call {name}",
+            kind=SPAN_KIND_CLIENT,
+            attributes={"mcp.tool.name": name, "server.url": self.server_url}
+        ) as span:
+            params = types.CallToolRequestParams(
+                name=name,
+                arguments=arguments,
+                _meta=tracer.inject({"client_id": self.client_id}, span)
+            )
+            result = await self.session.send_request(
+                types.ClientRequest(types.CallToolRequest(method="tools/call", params=params)),
+                types.CallToolResult,
+            )
+            span.set_attribute("mcp.tool.is_error", result.isError)
+            return result
+
     async def disconnect(self):
         if self.session_context:
             await self.session_context.__aexit__(None, None, None)
         if self.client_context:
             await self.client_context.__aexit__(None, None, None)
+        if self.recorder:
+            self.recorder.close()
 
 
 async def main():
-    client = MCPClient("http://localhost:8000/mcp")
+    server_url = "http://localhost:8000/mcp"
+    client = MCPClient(server_url, recorder=TrafficRecorder.from_env(server_url))
     try:
         await client.connect()
     finally:
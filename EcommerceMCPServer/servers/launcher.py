@@ -9,7 +9,7 @@ import time
 import requests
 import logging
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 logger = logging.getLogger(__name__)
 
@@ -19,10 +19,15 @@ class ServerLauncher:
     def __init__(self):
         self.processes: List[subprocess.Popen] = []
     
-    def start_ecommerce_server(self, port: int = 8000, host: str = "localhost") -> bool:
-        """Start the ecommerce conversion server with health monitoring."""
+    def start_ecommerce_server(
+        self,
+        port: int = 8000,
+        host: str = "localhost",
+        env: Optional[Dict[str, str]] = None
+    ) -> bool:
+        """Start the ecommerce conversion server with health monitoring. `env` replaces the inherited environment."""
         try:
-            server_path = Path(__file__).parent / "ecommerce_server.py"
+            server_path = Path(__file__).parent / "streamablehttp_server.py"
             
             cmd = [
                 sys.executable, # Path to current Python interpreter
@@ -37,7 +42,8 @@ class ServerLauncher:
                 cmd,
                 stdout=subprocess.PIPE,
                 stderr=subprocess.PIPE,
-                text=True
+                text=True,
+                env=env
             )
             
             self.processes.append(process)
@@ -1,20 +1,120 @@
 #from fastmcp import FastMCP
-from mcp.server.fastmcp import FastMCP
+from mcp.server.fastmcp import FastMCP, Context
 import click
+import json
 import logging
+import sys
+from pathlib import Path
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional
+
+# Make the shared src/ utilities importable when run as a script
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from src.utils.tracing import tracer, SPAN_KIND_SERVER
+from src.utils.recommender import CoPurchaseRecommender
+from src.utils.recorder import TrafficRecorder
+
+PRODUCT_CATALOG = {
+    "SKU-LAPTOP": "Laptop",
+    "SKU-SMARTPHONE": "Smartphone",
+    "SKU-HEADPHONES": "Headphones",
+    "SKU-CAMERA": "Camera",
+    "SKU-SMARTWATCH": "Smartwatch",
+}
+
+# Carts are kept per client and bounded, since nothing expires them when a client goes away
+MAX_CARTS = 1000
+MAX_CART_ITEMS = 50
+
+def resolve_sku(product: str) -> Optional[str]:
+    """Map a SKU or a product name (case-insensitive) to its catalog SKU."""
+    if product in PRODUCT_CATALOG:
+        return product
+    for sku, name in PRODUCT_CATALOG.items():
+        if name.lower() == product.strip().lower():
+            return sku
+    return None
+
+class TransportSpanMiddleware:
+    """
+    ASGI middleware that opens a server span per HTTP request, covering body receipt, JSON-RPC
+    dispatch and response serialization. Tool handler spans are created inside it.
+
+    The parent is the `traceparent` in the JSON-RPC request's `_meta`, falling back to the HTTP
+    header. Reading `_meta` means buffering the request body, which MCP messages keep small.
+    """
+
+    def __init__(self, app: Any):
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        received = []
+        body = b""
+        while True:
+            message = await receive()
+            received.append(message)
+            if message["type"] != "http.request":
+                break
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+
+        rpc = self._first_message(body)
+        meta = (rpc.get("params") or {}).get("_meta")
+        headers = {key.decode("latin-1"): value.decode("latin-1") for key, value in scope["headers"]}
+        parent = tracer.extract(meta) if isinstance(meta, dict) else None
+
+        attributes = {"http.request.method": scope["method"], "url.path": scope["path"]}
+        if "method" in rpc:
+            attributes["mcp.method"] = rpc["method"]
+
+        async def replay_receive() -> Dict[str, Any]:
+            if received:
+                return received.pop(0)
+            return await receive()
+
+        with tracer.span(
+            f"{scope['method']} {scope['path']}",
+            kind=SPAN_KIND_SERVER,
+            attributes=attributes,
+            parent=parent or tracer.extract(headers)
+        ) as span:
+            async def traced_send(message: Dict[str, Any]) -> None:
+                if message["type"] == "http.response.start":
+                    span.set_attribute("http.response.status_code", message["status"])
+                await send(message)
+
+            await self.app(scope, replay_receive, traced_send)
+
+    def _first_message(self, body: bytes) -> Dict[str, Any]:
+        """The first JSON-RPC message of a request body, or {} if there is none."""
+        try:
+            rpc = json.loads(body) if body else {}
+        except ValueError:
+            return {}
+        if isinstance(rpc, list):
+            rpc = rpc[0] if rpc else {}
+        return rpc if isinstance(rpc, dict) else {}
 
 @click.command()
 @click.option("--port", default=8000, help="Port to run the server on")
 @click.option("--host", default="localhost", help="Host to bind the server to")
 @click.option("--log-level", default="INFO", help="Logging level")
+@click.option("--record", default=None, help="Record all MCP traffic to this file (or set MCP_RECORD_PATH)")
 
-def main(port: int, host: str, log_level: str) -> None:
+def main(port: int, host: str, log_level: str, record: Optional[str]) -> None:
     logging.basicConfig(
         level=getattr(logging, log_level.upper(), logging.INFO),
         format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
     )
     logger = logging.getLogger(__name__)
     logger.info("Starting  Ecommerce MCP Server...")
+    tracer.configure(service_name="ecommerce-mcp-server")
 
     mcp = FastMCP(
         "Ecommerce Server",
@@ -23,31 +123,150 @@ def main(port: int, host: str, log_level: str) -> None:
         stateless_http=True  # Enable streamable HTTP protocol
     )
 
+    server_url = f"http://{host}:{port}/mcp"
+    recorder = TrafficRecorder(record, server_url) if record else TrafficRecorder.from_env(server_url)
+    if recorder:
+        # Opened up front so an unusable path fails at startup rather than on the first request
+        recorder.open()
+        # Every transport session, from any client (the agent included), runs through the
+        # low-level server's run(), so wrapping its streams there records all traffic
+        server_run = mcp._mcp_server.run
+
+        async def recording_run(read_stream, write_stream, *args, **kwargs):
+            read_stream, write_stream = recorder.wrap(read_stream, write_stream, server_side=True)
+            return await server_run(read_stream, write_stream, *args, **kwargs)
+
+        mcp._mcp_server.run = recording_run
+
+    recommender = CoPurchaseRecommender(PRODUCT_CATALOG)
+    recommender.load_history()
+    carts: "OrderedDict[str, List[str]]" = OrderedDict()
+
+    def client_cart(ctx: Context) -> Optional[List[str]]:
+        """
+        Cart of the calling client, keyed by the `client_id` it sends in request `_meta`.
+
+        Returns None for anonymous clients; their cart activity is not fed to the recommender.
+        """
+        client_id = ctx.client_id
+        if not client_id:
+            return None
+        if client_id in carts:
+            carts.move_to_end(client_id)
+        else:
+            carts[client_id] = []
+            if len(carts) > MAX_CARTS:
+                carts.popitem(last=False)
+        return carts[client_id]
+
     @mcp.resource("products://list_products")
     def list_products() -> list:
         """List the products available in the store."""
-        products_list = ["Laptop", "Smartphone", "Headphones", "Camera", "Smartwatch"]
+        products_list = list(PRODUCT_CATALOG.values())
         return products_list
   
+    def handler_span(name: str, ctx: Context, **attributes):
+        """
+        Open the span for a tool handler, as a child of the HTTP request's transport span.
+
+        Without a transport span (e.g. over stdio) the trace context is read from the request
+        `_meta`, falling back to a W3C `traceparent` HTTP header.
+        """
+        parent = None
+        if tracer.current_span() is None:
+            parent = tracer.extract(ctx.request_context.meta)
+            request = ctx.request_context.request
+            if parent is None and request is not None:
+                parent = tracer.extract(dict(request.headers))
+
+        return tracer.span(
+            f"tools/call {name}",
+            attributes={"mcp.tool.name": name, "mcp.request.id": str(ctx.request_id), **attributes},
+            parent=parent
+        )
+
     @mcp.tool("add_to_cart://{product_name}")
-    def add_to_cart(product_name: str) -> str:
+    def add_to_cart(product_name: str, ctx: Context) -> str:
         """
         Add a product to the shopping cart.
 
         This tool allows a client to add a specified product to their shopping cart.
         The product name should match one of the available products.
         """
-        # Here, you would typically add the product to a user's cart in a database or session.
-        return f"Product '{product_name}' has been added to your cart."
+        with handler_span("add_to_cart", ctx, **{"product.name": product_name}):
+            with tracer.span("add_to_cart.update_cart"):
+                # Here, you would typically add the product to a user's cart in a database or session.
+                sku = resolve_sku(product_name)
+                cart = client_cart(ctx)
+                if sku and cart is not None and len(cart) < MAX_CART_ITEMS:
+                    recommender.record_cart_add(cart, sku)
+                    cart.append(sku)
+
+            return f"Product '{product_name}' has been added to your cart."
     
     @mcp.tool(
         title="cart checkout",
         description="Proceed to checkout and finalize the purchase of items in the cart.",
     )
-    def checkout() -> str:
-        # Here, you would typically process the payment and finalize the order.
-        return "Checkout complete! Your order has been placed successfully."
+    def checkout(ctx: Context) -> str:
+        with handler_span("checkout", ctx):
+            # Here, you would typically process the payment and finalize the order.
+            cart = carts.pop(ctx.client_id, None) if ctx.client_id else None
+            if cart:
+                with tracer.span("checkout.record_order"):
+                    recommender.record_order(cart)
+
+            return "Checkout complete! Your order has been placed successfully."
+
+    @mcp.tool()
+    def related_products(sku: str, ctx: Context, k: int = 3) -> list:
+        """
+        Suggest products that are frequently bought or carted together with a given product.
+
+        Accepts a product SKU or a product name from list_products, and returns up to k
+        related products with their SKU, name and relevance score, best match first.
+        """
+        with handler_span("related_products", ctx, **{"product.sku": sku, "k": k}):
+            resolved = resolve_sku(sku)
+            if resolved is None:
+                return []
+
+            with tracer.span("related_products.rank"):
+                related = recommender.related(resolved, k)
+
+            return [
+                {"sku": item["sku"], "name": PRODUCT_CATALOG[item["sku"]], "score": item["score"]}
+                for item in related
+            ]
     
+    def shutdown() -> None:
+        """Release resources that must outlive every request. Safe to call more than once."""
+        tracer.flush()
+        if recorder:
+            recorder.close()
+
+    build_http_app = mcp.streamable_http_app
+
+    def streamable_http_app():
+        app = build_http_app()
+        app.add_middleware(TransportSpanMiddleware)
+        session_lifespan = app.router.lifespan_context
+
+        # Uvicorn runs the app's lifespan shutdown and then re-raises SIGTERM, so neither
+        # `finally` below nor atexit handlers run on a plain `kill`; the lifespan does
+        @asynccontextmanager
+        async def lifespan(app):
+            try:
+                async with session_lifespan(app):
+                    yield
+            finally:
+                shutdown()
+
+        app.router.lifespan_context = lifespan
+        return app
+
+    mcp.streamable_http_app = streamable_http_app
+
     try:
         logger.info(f"Ecommerce server running on {host}:{port}")
         mcp.run(transport="streamable-http")  # Use new streamable HTTP transport
@@ -57,6 +276,7 @@ def main(port: int, host: str, log_level: str) -> None:
         logger.error(f"Server error: {e}")
         raise
     finally:
+        shutdown()
         logger.info("Ecommerce server stopped")
 
 
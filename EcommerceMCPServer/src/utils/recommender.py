@@ -0,0 +1,278 @@
+"""Related-product recommendations from co-purchase and co-cart statistics."""
+
+import os
+import json
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Any, Iterable, List, Optional
+import numpy as np
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+
+class CoPurchaseRecommender:
+    """
+    Maintains item co-occurrence matrices and item embeddings for fast related-item lookups.
+
+    Counts are updated in place on every cart add and order. Embeddings are derived from the
+    counts (PPMI + truncated eigendecomposition) and, after every `refresh_every` updates,
+    rebuilt on a background thread by a few warm-started subspace iterations. Lookups only
+    read the embeddings already built, so they stay a handful of vectorized operations.
+    """
+
+    def __init__(
+        self,
+        skus: Iterable[str],
+        embedding_dim: int = 16,
+        refresh_every: int = 32,
+        cart_weight: float = 0.3,
+        direct_weight: float = 0.5
+    ):
+        """
+        Initialize the recommender.
+
+        Args:
+            skus: Catalog SKUs. Events mentioning other SKUs are ignored until add_sku is called.
+            embedding_dim: Maximum size of each item embedding vector.
+            refresh_every: Number of recorded events after which embeddings are rebuilt.
+            cart_weight: Weight of co-cart counts relative to co-purchase counts.
+            direct_weight: Weight of direct co-occurrence versus embedding similarity in scores.
+        """
+        self.embedding_dim = embedding_dim
+        self.refresh_every = refresh_every
+        self.cart_weight = cart_weight
+        self.direct_weight = direct_weight
+
+        skus = list(skus)
+        capacity = max(len(skus), 8)
+        self.skus: List[str] = []
+        self._index: Dict[str, int] = {}
+        self.co_purchase = np.zeros((capacity, capacity), dtype=np.float32)
+        self.co_cart = np.zeros((capacity, capacity), dtype=np.float32)
+        # Rows cover the SKUs known at the last refresh; later SKUs rely on direct counts only
+        self.embeddings = np.zeros((0, 1), dtype=np.float32)
+        self._basis: Optional[np.ndarray] = None
+        self._rng = np.random.default_rng(0)
+
+        # Held by count updates and by the refresh snapshot, so a snapshot never sees half an update
+        self._lock = threading.Lock()
+        self._pending_updates = 0
+        self._auto_refresh = True
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embedding-refresh")
+        self._refresh_future: Optional[Future] = None
+
+        for sku in skus:
+            self.add_sku(sku)
+
+    def add_sku(self, sku: str) -> int:
+        """Register a SKU, doubling the matrix capacity when it is full. Returns its row index."""
+        if sku in self._index:
+            return self._index[sku]
+
+        with self._lock:
+            n = len(self.skus)
+            if n == self.co_purchase.shape[0]:
+                self._grow(2 * n)
+
+            self._index[sku] = n
+            self.skus.append(sku)
+        return n
+
+    def _grow(self, capacity: int) -> None:
+        n = len(self.skus)
+        for name in ("co_purchase", "co_cart"):
+            grown = np.zeros((capacity, capacity), dtype=np.float32)
+            grown[:n, :n] = getattr(self, name)[:n, :n]
+            setattr(self, name, grown)
+
+    def _indices(self, skus: Iterable[str]) -> np.ndarray:
+        """Row indices of the known SKUs among `skus`; unknown SKUs are skipped."""
+        return np.unique([self._index[sku] for sku in skus if sku in self._index]).astype(np.intp)
+
+    def record_cart_add(self, cart_skus: Iterable[str], sku: str) -> None:
+        """Record that `sku` was added to a cart already holding `cart_skus`."""
+        i = self._index.get(sku)
+        if i is None:
+            logger.debug(f"Ignoring cart add of unknown SKU: {sku}")
+            return
+        others = self._indices(cart_skus)
+        others = others[others != i]
+
+        with self._lock:
+            self.co_cart[i, i] += 1
+            self.co_cart[i, others] += 1
+            self.co_cart[others, i] += 1
+        self._note_update()
+
+    def record_order(self, skus: Iterable[str]) -> None:
+        """Record a completed order. The diagonal counts how many orders contain each item."""
+        idx = self._indices(skus)
+        if idx.size == 0:
+            return
+
+        with self._lock:
+            self.co_purchase[np.ix_(idx, idx)] += 1
+        self._note_update()
+
+    def _note_update(self) -> None:
+        self._pending_updates += 1
+        if not self._auto_refresh or self._pending_updates < self.refresh_every:
+            return
+        if self._refresh_future is None or self._refresh_future.done():
+            self._refresh_future = self._executor.submit(self._refresh_in_background)
+
+    def _refresh_in_background(self) -> None:
+        try:
+            self.refresh()
+        except Exception as e:
+            logger.error(f"Failed to refresh item embeddings: {e}")
+
+    def load_history(self, path: Optional[str] = None) -> None:
+        """
+        Seed counts from a JSON history file of the form {"carts": [[sku, ...]], "orders": [[sku, ...]]}.
+
+        Each cart is replayed as a sequence of adds. SKUs outside the catalog are skipped and a
+        missing file is not an error.
+        """
+        history_path = self._resolve_history_path(path)
+        if not history_path.exists():
+            logger.info(f"No order history found at {history_path}, starting cold")
+            return
+
+        try:
+            with open(history_path, 'r', encoding='utf-8') as f:
+                history = json.load(f)
+
+            carts = history.get("carts", [])
+            orders = history.get("orders", [])
+            unknown = {sku for basket in carts + orders for sku in basket if sku not in self._index}
+            if unknown:
+                logger.warning(f"Ignoring {len(unknown)} SKUs not in the catalog: {sorted(unknown)}")
+
+            self._auto_refresh = False
+            try:
+                for cart in carts:
+                    for position, sku in enumerate(cart):
+                        self.record_cart_add(cart[:position], sku)
+
+                for order in orders:
+                    self.record_order(order)
+            finally:
+                self._auto_refresh = True
+
+            self.refresh()
+            logger.info(f"Order history loaded from: {history_path}")
+
+        except Exception as e:
+            logger.error(f"Failed to load order history: {e}")
+            raise
+
+    def _resolve_history_path(self, path: Optional[str]) -> Path:
+        """Resolve history file path with fallbacks."""
+        if path:
+            return Path(path)
+
+        env_path = os.getenv("MCP_ORDER_HISTORY_PATH")
+        if env_path:
+            return Path(env_path)
+
+        project_root = Path(__file__).parent.parent.parent
+        return project_root / "data" / "order_history.json"
+
+    def refresh(self) -> None:
+        """Rebuild item embeddings from the current counts, warm-starting from the previous ones."""
+        with self._lock:
+            self._pending_updates = 0
+            n = len(self.skus)
+            counts = self.co_purchase[:n, :n] + self.cart_weight * self.co_cart[:n, :n]
+        np.fill_diagonal(counts, 0)
+        total = counts.sum()
+        if total == 0:
+            self.embeddings = np.zeros((n, 1), dtype=np.float32)
+            return
+
+        # Positive pointwise mutual information downweights items that co-occur with everything.
+        # Co-occurrence is sparse, so it is only evaluated where a pair has been seen together
+        marginals = counts.sum(axis=1)
+        rows, cols = np.nonzero(counts)
+        pmi = np.log(counts[rows, cols] * total / (marginals[rows] * marginals[cols]))
+        ppmi = np.zeros_like(counts)
+        ppmi[rows, cols] = np.maximum(pmi, 0)
+
+        vectors = self._factorize(ppmi)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        # Swapped in with a single assignment, so concurrent lookups see old or new, never partial
+        self.embeddings = (vectors / norms).astype(np.float32)
+
+    def _factorize(self, ppmi: np.ndarray) -> np.ndarray:
+        """
+        Approximate the leading eigenpairs of the symmetric PPMI matrix by subspace iteration.
+
+        The previous basis is reused as the starting point, so a refresh after a few new events
+        converges in a couple of O(n^2 * dim) iterations instead of a full O(n^3) decomposition.
+        """
+        n = ppmi.shape[0]
+        dim = min(self.embedding_dim, n)
+        basis = self._basis
+        if basis is None or basis.shape[1] != dim:
+            basis = self._rng.standard_normal((n, dim), dtype=np.float32)
+            iterations = 12
+        else:
+            if basis.shape[0] < n:
+                new_rows = 1e-3 * self._rng.standard_normal((n - basis.shape[0], dim), dtype=np.float32)
+                basis = np.vstack([basis, new_rows])
+            iterations = 3
+
+        for _ in range(iterations):
+            basis, _ = np.linalg.qr(ppmi @ basis)
+
+        # Rayleigh-Ritz step: rotate the subspace onto the eigenvectors it spans
+        eigenvalues, rotation = np.linalg.eigh(basis.T @ ppmi @ basis)
+        basis = basis @ rotation
+        self._basis = basis
+        return basis * np.sqrt(np.maximum(eigenvalues, 0))
+
+    def related(self, sku: str, k: int = 5) -> List[Dict[str, Any]]:
+        """
+        Return up to `k` related SKUs, best first, as dicts with "sku" and "score".
+
+        Scores blend the item's normalized co-occurrence row with embedding cosine similarity.
+        Unknown SKUs and items without any history have no related items.
+        """
+        i = self._index.get(sku)
+        if i is None or k <= 0:
+            return []
+
+        n = len(self.skus)
+        direct = self.co_purchase[i, :n] + self.cart_weight * self.co_cart[i, :n]
+        direct[i] = 0
+        peak = direct.max()
+        if peak > 0:
+            direct = direct / peak
+
+        embeddings = self.embeddings
+        similarity = np.zeros(n, dtype=np.float32)
+        if i < embeddings.shape[0]:
+            similarity[:embeddings.shape[0]] = embeddings @ embeddings[i]
+
+        scores = self.direct_weight * direct + (1 - self.direct_weight) * similarity
+        scores[i] = -np.inf
+
+        k = min(k, n - 1)
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        return [
+            {"sku": self.skus[j], "score": round(float(scores[j]), 4)}
+            for j in top
+            if scores[j] > 0
+        ]
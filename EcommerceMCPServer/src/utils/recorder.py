@@ -0,0 +1,262 @@
+"""
+MCP Traffic Recorder
+Captures the JSON-RPC messages exchanged by MCP sessions, with timings, to a compact file.
+"""
+
+import os
+import zlib
+import gzip
+import json
+import time
+import logging
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import anyio
+from mcp.shared.message import SessionMessage
+
+logger = logging.getLogger(__name__)
+
+# Recording format: gzip-compressed JSON Lines. The first line is a header object, every
+# following line is one event: [offset_ms, session_id, direction, jsonrpc_message].
+# The compressor is sync-flushed after every line, so a file cut short by a killed process
+# still decompresses up to its last complete event
+FORMAT_VERSION = 1
+OUTGOING = "o"
+INCOMING = "i"
+
+
+class TrafficRecorder:
+    """Records MCP traffic, on the client or the server, for later replay."""
+
+    def __init__(self, path: Optional[str] = None, server_url: Optional[str] = None):
+        """Initialize with optional recording path override."""
+        self.path = self._resolve_path(path)
+        self.server_url = server_url
+        self._file = None
+        self._gzip: Optional[gzip.GzipFile] = None
+        self._start = 0.0
+        self._next_session_id = 0
+        self._client_sessions: Dict[str, int] = {}
+
+    @classmethod
+    def from_env(cls, server_url: Optional[str] = None) -> Optional["TrafficRecorder"]:
+        """Create a recorder if MCP_RECORD_PATH is set, otherwise None."""
+        return cls(None, server_url) if os.getenv("MCP_RECORD_PATH") else None
+
+    def _resolve_path(self, path: Optional[str]) -> Path:
+        """
+        Resolve recording file path with fallbacks.
+
+        MCP_RECORD_PATH may be inherited by several processes (a server, its clients, a launched
+        server), so the process id and start time are added to it to give each its own file.
+        """
+        if path:
+            return Path(path)
+
+        stamp = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+        env_path = os.getenv("MCP_RECORD_PATH")
+        if env_path:
+            env_path = Path(env_path)
+            stem, dot, extensions = env_path.name.partition(".")
+            return env_path.with_name(f"{stem}-{stamp}{dot}{extensions}")
+
+        project_root = Path(__file__).parent.parent.parent
+        return project_root / "recordings" / f"mcp-{stamp}.jsonl.gz"
+
+    def open(self) -> None:
+        """Create the recording file and write its header. An existing file is never overwritten."""
+        if self._file is not None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            raw = open(self.path, 'xb')
+        except FileExistsError:
+            raise FileExistsError(f"Refusing to overwrite existing recording: {self.path}")
+        self._gzip = gzip.GzipFile(fileobj=raw, mode='wb')
+        self._file = raw
+        self._start = time.perf_counter()
+        header = {"version": FORMAT_VERSION, "server_url": self.server_url, "started_at": time.time()}
+        self._write_line(json.dumps(header))
+        logger.info(f"Recording MCP traffic to: {self.path}")
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._gzip.close()
+            self._file.close()
+            self._gzip = None
+            self._file = None
+            logger.info(f"Recording saved to: {self.path}")
+
+    def _write_line(self, line: str) -> None:
+        self._gzip.write((line + "\n").encode("utf-8"))
+        self._gzip.flush(zlib.Z_SYNC_FLUSH)
+
+    def wrap(
+        self,
+        read_stream: Any,
+        write_stream: Any,
+        server_side: bool = False
+    ) -> Tuple["RecordingReadStream", "RecordingWriteStream"]:
+        """
+        Wrap a session's streams so every message passing through them is recorded.
+
+        Directions are always recorded from the client's point of view. A stateless HTTP server
+        runs a separate session per request, so server-side messages are grouped into one
+        recorded session per `client_id` sent in the request `_meta`, where there is one.
+        """
+        self.open()
+        tag = _SessionTag(self, group_by_client=server_side)
+        if server_side:
+            return RecordingReadStream(read_stream, tag, OUTGOING), RecordingWriteStream(write_stream, tag, INCOMING)
+        return RecordingReadStream(read_stream, tag, INCOMING), RecordingWriteStream(write_stream, tag, OUTGOING)
+
+    def _session_id_for(self, client_id: Optional[str] = None) -> int:
+        if client_id in self._client_sessions:
+            return self._client_sessions[client_id]
+        session_id = self._next_session_id
+        self._next_session_id += 1
+        if client_id:
+            self._client_sessions[client_id] = session_id
+        return session_id
+
+    def record(self, tag: "_SessionTag", direction: str, item: Any) -> None:
+        # Transports also put exceptions on the read stream; only protocol messages are recorded
+        if self._file is None or not isinstance(item, SessionMessage):
+            return
+        offset_ms = round((time.perf_counter() - self._start) * 1000, 3)
+        message = item.message.model_dump(by_alias=True, mode="json", exclude_none=True)
+        event = [offset_ms, tag.resolve(message), direction, message]
+        self._write_line(json.dumps(event, separators=(",", ":")))
+
+
+class _SessionTag:
+    """Session id shared by a wrapped stream pair, assigned on the first recorded message."""
+
+    def __init__(self, recorder: TrafficRecorder, group_by_client: bool):
+        self._recorder = recorder
+        self._group_by_client = group_by_client
+        self.session_id: Optional[int] = None
+
+    def resolve(self, message: Dict[str, Any]) -> int:
+        if self.session_id is None:
+            client_id = None
+            if self._group_by_client:
+                client_id = ((message.get("params") or {}).get("_meta") or {}).get("client_id")
+            self.session_id = self._recorder._session_id_for(client_id)
+        return self.session_id
+
+
+class RecordingReadStream:
+    """Receive stream wrapper that records every message received."""
+
+    def __init__(self, stream: Any, tag: _SessionTag, direction: str):
+        self._stream = stream
+        self._tag = tag
+        self._direction = direction
+
+    async def receive(self) -> Any:
+        item = await self._stream.receive()
+        self._tag._recorder.record(self._tag, self._direction, item)
+        return item
+
+    def __aiter__(self) -> "RecordingReadStream":
+        return self
+
+    async def __anext__(self) -> Any:
+        try:
+            return await self.receive()
+        except anyio.EndOfStream:
+            raise StopAsyncIteration
+
+    async def __aenter__(self) -> "RecordingReadStream":
+        await self._stream.__aenter__()
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> Any:
+        return await self._stream.__aexit__(*exc_info)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._stream, name)
+
+
+class RecordingWriteStream:
+    """Send stream wrapper that records every message sent."""
+
+    def __init__(self, stream: Any, tag: _SessionTag, direction: str):
+        self._stream = stream
+        self._tag = tag
+        self._direction = direction
+
+    async def send(self, item: Any) -> None:
+        self._tag._recorder.record(self._tag, self._direction, item)
+        await self._stream.send(item)
+
+    async def __aenter__(self) -> "RecordingWriteStream":
+        await self._stream.__aenter__()
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> Any:
+        return await self._stream.__aexit__(*exc_info)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._stream, name)
+
+
+def load_recording(path: str) -> Tuple[Dict[str, Any], Dict[int, List[List[Any]]]]:
+    """
+    Read a recording, returning its header and the events grouped by session id.
+
+    A recording whose process was killed before closing it ends without a gzip trailer and
+    possibly mid-line; the events before the cut are returned.
+    """
+    lines: List[str] = []
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        try:
+            for line in f:
+                lines.append(line)
+        except EOFError:
+            logger.warning(f"Recording {path} is truncated, reading the {len(lines)} complete lines before the cut")
+
+    if lines and not lines[-1].endswith("\n"):
+        lines.pop()
+    if not lines:
+        raise ValueError(f"Recording {path} is empty")
+
+    header = json.loads(lines[0])
+    if header.get("version") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported recording version: {header.get('version')}")
+
+    sessions: Dict[int, List[List[Any]]] = {}
+    for line in lines[1:]:
+        if line.strip():
+            event = json.loads(line)
+            sessions.setdefault(event[1], []).append(event)
+    return header, sessions
+
+
+def iter_exchanges(events: List[List[Any]]) -> Iterator[Dict[str, Any]]:
+    """
+    Pair each outgoing message in a session with its response.
+
+    Yields dicts with the message, its offset from the session's first event and, for requests
+    that were answered, the recorded latency in milliseconds. Responses are matched to the
+    latest pending request with the same id, since a session grouped by client id can span
+    several protocol sessions whose request ids overlap.
+    """
+    if not events:
+        return
+    origin = events[0][0]
+    exchanges: List[Dict[str, Any]] = []
+    pending: Dict[Any, Tuple[float, Dict[str, Any]]] = {}
+
+    for offset_ms, _, direction, message in events:
+        if direction == OUTGOING and "method" in message:
+            exchange = {"offset_ms": offset_ms - origin, "message": message, "latency_ms": None}
+            exchanges.append(exchange)
+            if "id" in message:
+                pending[message["id"]] = (offset_ms, exchange)
+        elif direction == INCOMING and "method" not in message and message.get("id") in pending:
+            sent_at, exchange = pending.pop(message["id"])
+            exchange["latency_ms"] = offset_ms - sent_at
+
+    yield from exchanges
@@ -0,0 +1,376 @@
+"""Lightweight in-process tracing with OTLP-compatible JSON export."""
+
+import os
+import json
+import time
+import random
+import atexit
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Any, Iterator, List, Optional
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# OTLP span kinds
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+
+# OTLP status codes
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+# Key used to carry the W3C trace context inside MCP request `_meta`
+TRACEPARENT_KEY = "traceparent"
+
+
+class SpanContext:
+    """Identifies a span within a trace, possibly one recorded by another process."""
+
+    __slots__ = ("trace_id", "span_id", "sampled")
+
+    def __init__(self, trace_id: str, span_id: str, sampled: bool):
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.sampled = sampled
+
+    def to_traceparent(self) -> str:
+        """Encode as a W3C `traceparent` header value."""
+        flags = "01" if self.sampled else "00"
+        return f"00-{self.trace_id}-{self.span_id}-{flags}"
+
+    @classmethod
+    def from_traceparent(cls, value: str) -> Optional["SpanContext"]:
+        """Decode a W3C `traceparent` value, returning None if it is malformed."""
+        parts = value.split("-") if isinstance(value, str) else []
+        if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+            return None
+        try:
+            flags = int(parts[3], 16)
+            int(parts[1], 16)
+            int(parts[2], 16)
+        except ValueError:
+            return None
+        return cls(parts[1], parts[2], bool(flags & 0x01))
+
+
+class Span:
+    """A timed operation. Unsampled spans keep their context for propagation but are never exported."""
+
+    __slots__ = ("tracer", "name", "context", "parent_span_id", "kind",
+                 "attributes", "start_ns", "end_ns", "status_code", "status_message")
+
+    def __init__(
+        self,
+        tracer: "Tracer",
+        name: str,
+        context: SpanContext,
+        parent_span_id: Optional[str],
+        kind: int,
+        attributes: Optional[Dict[str, Any]] = None
+    ):
+        self.tracer = tracer
+        self.name = name
+        self.context = context
+        self.parent_span_id = parent_span_id
+        self.kind = kind
+        self.attributes = attributes or {}
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.status_code = 0
+        self.status_message = ""
+
+    @property
+    def is_recording(self) -> bool:
+        return self.context.sampled and self.end_ns is None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        if self.is_recording:
+            self.attributes[key] = value
+
+    def set_error(self, error: BaseException) -> None:
+        self.status_code = STATUS_ERROR
+        self.status_message = f"{type(error).__name__}: {error}"
+
+    def end(self) -> None:
+        """Finish the span and hand it to the recorder. Ending twice is a no-op."""
+        if self.end_ns is not None:
+            return
+        self.end_ns = time.time_ns()
+        if self.context.sampled:
+            self.tracer._record(self)
+
+    def to_otlp(self) -> Dict[str, Any]:
+        """Serialize using the OTLP/JSON span encoding."""
+        span = {
+            "traceId": self.context.trace_id,
+            "spanId": self.context.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": _otlp_attributes(self.attributes),
+            "status": {"code": self.status_code},
+        }
+        if self.parent_span_id:
+            span["parentSpanId"] = self.parent_span_id
+        if self.status_message:
+            span["status"]["message"] = self.status_message
+        return span
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [{"key": key, "value": _otlp_value(value)} for key, value in attributes.items()]
+
+
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar(
+    "mcp_current_span", default=None
+)
+
+
+class Tracer:
+    """
+    Records spans in memory and periodically appends them to a local OTLP JSON Lines file.
+
+    Ending a span only appends it to a buffer. A background flusher thread is the file's only
+    writer, so serialization and file I/O never run on the caller's thread (e.g. an event loop).
+    """
+
+    def __init__(
+        self,
+        service_name: Optional[str] = None,
+        export_path: Optional[str] = None,
+        sample_rate: Optional[float] = None,
+        batch_size: int = 256,
+        flush_interval: Optional[float] = None
+    ):
+        """
+        Initialize the tracer.
+
+        Args:
+            service_name: Reported as the OTLP `service.name` resource attribute.
+            export_path: File that exported batches are appended to.
+            sample_rate: Fraction of new traces to record, between 0.0 and 1.0.
+            batch_size: Number of finished spans buffered before they are written out.
+            flush_interval: Maximum seconds a finished span waits in the buffer before export.
+        """
+        self.service_name = service_name or os.getenv("MCP_TRACE_SERVICE_NAME", "ecommerce-mcp")
+        self.export_path = self._resolve_export_path(export_path)
+        self.sample_rate = self._resolve_sample_rate(sample_rate)
+        self.batch_size = batch_size
+        self.flush_interval = self._resolve_flush_interval(flush_interval)
+        self._buffer: List[Span] = []
+        self._lock = threading.Lock()
+        # Set to make the flusher export before its interval is up
+        self._wake = threading.Event()
+        # Spans recorded and exported so far; flush() waits for the second to catch up
+        self._recorded = 0
+        self._exported = 0
+        self._exported_changed = threading.Condition(self._lock)
+        self._flusher: Optional[threading.Thread] = None
+        atexit.register(self.flush)
+
+    def _resolve_export_path(self, export_path: Optional[str]) -> Path:
+        """Resolve export file path with fallbacks."""
+        if export_path:
+            return Path(export_path)
+
+        env_path = os.getenv("MCP_TRACE_FILE")
+        if env_path:
+            return Path(env_path)
+
+        project_root = Path(__file__).parent.parent.parent
+        return project_root / "traces" / "spans.otlp.jsonl"
+
+    def _resolve_sample_rate(self, sample_rate: Optional[float]) -> float:
+        if sample_rate is None:
+            try:
+                sample_rate = float(os.getenv("MCP_TRACE_SAMPLE_RATE", "0.1"))
+            except ValueError:
+                logger.warning("Invalid MCP_TRACE_SAMPLE_RATE, falling back to 0.1")
+                sample_rate = 0.1
+        return min(max(sample_rate, 0.0), 1.0)
+
+    def _resolve_flush_interval(self, flush_interval: Optional[float]) -> float:
+        if flush_interval is None:
+            try:
+                flush_interval = float(os.getenv("MCP_TRACE_FLUSH_INTERVAL", "5"))
+            except ValueError:
+                logger.warning("Invalid MCP_TRACE_FLUSH_INTERVAL, falling back to 5s")
+                flush_interval = 5.0
+        return max(flush_interval, 0.1)
+
+    def configure(
+        self,
+        service_name: Optional[str] = None,
+        export_path: Optional[str] = None,
+        sample_rate: Optional[float] = None
+    ) -> None:
+        """Override settings on the global tracer, e.g. from a process entry point."""
+        self.flush()
+        if service_name:
+            self.service_name = service_name
+        if export_path:
+            self.export_path = Path(export_path)
+        if sample_rate is not None:
+            self.sample_rate = self._resolve_sample_rate(sample_rate)
+
+    def start_span(
+        self,
+        name: str,
+        kind: int = SPAN_KIND_INTERNAL,
+        attributes: Optional[Dict[str, Any]] = None,
+        parent: Optional[Any] = None
+    ) -> Span:
+        """
+        Start a span without making it current.
+
+        Args:
+            name: Operation name.
+            kind: One of the SPAN_KIND_* constants.
+            attributes: Initial span attributes.
+            parent: A Span or SpanContext; defaults to the current span. A new trace is
+                started (and the sampling decision made) when there is no parent.
+        """
+        if parent is None:
+            parent = _current_span.get()
+        parent_context = parent.context if isinstance(parent, Span) else parent
+
+        if parent_context is None:
+            context = SpanContext(
+                f"{random.getrandbits(128):032x}",
+                f"{random.getrandbits(64):016x}",
+                random.random() < self.sample_rate
+            )
+            return Span(self, name, context, None, kind, attributes)
+
+        context = SpanContext(
+            parent_context.trace_id,
+            f"{random.getrandbits(64):016x}",
+            parent_context.sampled
+        )
+        return Span(self, name, context, parent_context.span_id, kind, attributes)
+
+    @contextmanager
+    def span(
+        self,
+        name: str,
+        kind: int = SPAN_KIND_INTERNAL,
+        attributes: Optional[Dict[str, Any]] = None,
+        parent: Optional[Any] = None
+    ) -> Iterator[Span]:
+        """Start a span, make it current for the enclosed block and end it on exit."""
+        span = self.start_span(name, kind, attributes, parent)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.set_error(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end()
+
+    def current_span(self) -> Optional[Span]:
+        return _current_span.get()
+
+    def inject(self, meta: Dict[str, Any], span: Optional[Span] = None) -> Dict[str, Any]:
+        """Add the trace context of `span` (or the current span) to an MCP `_meta` dict."""
+        span = span or _current_span.get()
+        if span is not None:
+            meta[TRACEPARENT_KEY] = span.context.to_traceparent()
+        return meta
+
+    def extract(self, meta: Any) -> Optional[SpanContext]:
+        """Read a remote trace context from an MCP `_meta` dict or RequestParams.Meta model."""
+        if meta is None:
+            return None
+        if isinstance(meta, dict):
+            value = meta.get(TRACEPARENT_KEY)
+        else:
+            value = getattr(meta, TRACEPARENT_KEY, None)
+            if value is None:
+                value = (getattr(meta, "model_extra", None) or {}).get(TRACEPARENT_KEY)
+        return SpanContext.from_traceparent(value) if value else None
+
+    def _record(self, span: Span) -> None:
+        with self._lock:
+            self._buffer.append(span)
+            self._recorded += 1
+            self._ensure_flusher()
+            if len(self._buffer) >= self.batch_size:
+                self._wake.set()
+
+    def _ensure_flusher(self) -> None:
+        """Start the background thread that exports buffered spans. Called with the lock held."""
+        if self._flusher is None:
+            self._flusher = threading.Thread(target=self._flush_periodically, name="span-flusher", daemon=True)
+            self._flusher.start()
+
+    def _flush_periodically(self) -> None:
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            with self._lock:
+                batch, self._buffer = self._buffer, []
+                recorded = self._recorded
+            if batch:
+                self._export(batch)
+            with self._lock:
+                self._exported = recorded
+                self._exported_changed.notify_all()
+
+    def flush(self, timeout: float = 5.0) -> None:
+        """Have the flusher thread write out all buffered spans, waiting up to `timeout` seconds."""
+        with self._lock:
+            if self._exported >= self._recorded:
+                return
+            target = self._recorded
+            self._ensure_flusher()
+            self._wake.set()
+            if not self._exported_changed.wait_for(lambda: self._exported >= target, timeout):
+                logger.warning(f"Timed out flushing {target - self._exported} spans")
+
+    def _export(self, batch: List[Span]) -> None:
+        """Append one OTLP ExportTraceServiceRequest per batch as a JSON line."""
+        payload = {
+            "resourceSpans": [{
+                "resource": {
+                    "attributes": _otlp_attributes({
+                        "service.name": self.service_name,
+                        "process.pid": os.getpid(),
+                    })
+                },
+                "scopeSpans": [{
+                    "scope": {"name": __name__},
+                    "spans": [span.to_otlp() for span in batch]
+                }]
+            }]
+        }
+
+        try:
+            self.export_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.export_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(payload, separators=(",", ":")) + "\n")
+        except Exception as e:
+            logger.error(f"Failed to export {len(batch)} spans: {e}")
+
+# Global tracer instance
+tracer = Tracer()